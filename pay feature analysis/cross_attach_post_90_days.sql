@@ -13,8 +13,7 @@ delayed_feature_activity AS (
     SELECT DISTINCT 
         fa.actor_id,
         fa.feature_name,
-        fa.feature_first_activity_date,
-        DATE_TRUNC(fa.feature_first_activity_date, MONTH) AS fa_month
+        fa.feature_first_activity_date
     FROM `federal-434709.sandbox.pay_features_base_v5` fa
     INNER JOIN user_onboarding uo ON fa.actor_id = uo.actor_id
     WHERE fa.feature_name IS NOT NULL
@@ -22,67 +21,86 @@ delayed_feature_activity AS (
 ),
 
 txns AS (
-    SELECT DISTINCT actor_id,
+    SELECT actor_id,
             txn_date,
             COUNT(DISTINCT transaction_id) AS txn_count
     FROM `federal-434709.sandbox.pay_details_v2`
     GROUP BY actor_id, txn_date
 ),
 
+-- Label each transaction day with its window, computing the day offset once
+window_txns AS (
+    SELECT
+        feature_name,
+        actor_id,
+        txn_count,
+        CASE 
+            WHEN days_from_feature BETWEEN 61 AND 90 THEN 'M2'
+            WHEN days_from_feature BETWEEN -90 AND -61 THEN '-M2'
+        END AS mx_months
+    FROM (
+        SELECT
+            dfa.feature_name,
+            dfa.actor_id,
+            t.txn_count,
+            DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) AS days_from_feature
+        FROM delayed_feature_activity dfa
+        INNER JOIN txns t ON dfa.actor_id = t.actor_id
+    )
+),
+
 -- Calculate metrics for each time window
 window_metrics AS (
     SELECT
-        dfa.feature_name,
-        CASE 
-            WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN 61 AND 90 THEN 'M2'
-            WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN -90 AND -61 THEN '-M2'
-        END AS mx_months,
-        dfa.actor_id,
-        SUM(t.txn_count) AS txn_count
-    FROM delayed_feature_activity dfa
-    LEFT JOIN txns t ON dfa.actor_id = t.actor_id 
-    WHERE CASE 
-            WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN 61 AND 90 THEN 'M2'
-            WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN -90 AND -61 THEN '-M2'
-        END IS NOT NULL
-    GROUP BY dfa.feature_name, 
-             CASE 
-                WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN 61 AND 90 THEN 'M2'
-                WHEN DATE_DIFF(t.txn_date, dfa.feature_first_activity_date, DAY) BETWEEN -90 AND -61 THEN '-M2'
-             END,
-             dfa.actor_id
+        feature_name,
+        mx_months,
+        actor_id,
+        SUM(txn_count) AS txn_count
+    FROM window_txns
+    WHERE mx_months IS NOT NULL
+    GROUP BY feature_name, mx_months, actor_id
+),
+
+-- Per-feature window totals, named for readability in the final select
+window_totals AS (
+    SELECT
+        feature_name,
+        SUM(CASE WHEN mx_months = 'M2' THEN txn_count ELSE 0 END) AS m2_txns,
+        COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END) AS m2_users,
+        SUM(CASE WHEN mx_months = '-M2' THEN txn_count ELSE 0 END) AS neg_m2_txns,
+        COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END) AS neg_m2_users
+    FROM window_metrics
+    GROUP BY feature_name
 )
 
 -- Final analysis with only M2 and -M2
 SELECT
     feature_name,
     -- M2 metrics
-    SUM(CASE WHEN mx_months = 'M2' THEN txn_count ELSE 0 END) AS M2_txns,
-    COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END) AS M2_users,
+    m2_txns AS M2_txns,
+    m2_users AS M2_users,
     CASE 
-        WHEN COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END) > 0 
-        THEN ROUND(SUM(CASE WHEN mx_months = 'M2' THEN txn_count ELSE 0 END) / COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END), 2)
+        WHEN m2_users > 0 
+        THEN ROUND(m2_txns / m2_users, 2)
         ELSE NULL 
     END AS M2_avg_txns,
     
     -- -M2 metrics
-    SUM(CASE WHEN mx_months = '-M2' THEN txn_count ELSE 0 END) AS `-M2_txns`,
-    COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END) AS `-M2_users`,
+    neg_m2_txns AS `-M2_txns`,
+    neg_m2_users AS `-M2_users`,
     CASE 
-        WHEN COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END) > 0 
-        THEN ROUND(SUM(CASE WHEN mx_months = '-M2' THEN txn_count ELSE 0 END) / COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END), 2)
+        WHEN neg_m2_users > 0 
+        THEN ROUND(neg_m2_txns / neg_m2_users, 2)
         ELSE NULL 
     END AS `-M2_avg_txns`,
     
     -- Percentage calculation using average transactions
     CASE 
-        WHEN COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END) > 0 
-        AND COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END) > 0
-        AND SUM(CASE WHEN mx_months = '-M2' THEN txn_count ELSE 0 END) > 0
-        THEN ROUND((SUM(CASE WHEN mx_months = '-M2' THEN txn_count ELSE 0 END) / COUNT(DISTINCT CASE WHEN mx_months = '-M2' THEN actor_id END)) / 
-                   (SUM(CASE WHEN mx_months = 'M2' THEN txn_count ELSE 0 END) / COUNT(DISTINCT CASE WHEN mx_months = 'M2' THEN actor_id END)) * 100, 2)
+        WHEN neg_m2_users > 0 
+        AND m2_users > 0
+        AND neg_m2_txns > 0
+        THEN ROUND((neg_m2_txns / neg_m2_users) / (m2_txns / m2_users) * 100, 2)
         ELSE NULL 
     END AS M2_percentage_change
-FROM window_metrics
-GROUP BY feature_name
+FROM window_totals
 ORDER BY feature_name; 
\ No newline at end of file
@@ -1,7 +1,8 @@
 -- BigQuery compatible version of pay_details_v2.sql
 -- Creates: federal-434709.sandbox.pay_details_v2
 
---CREATE OR REPLACE TABLE `federal-434709.sandbox.pay_details_v2` AS
+--CREATE OR REPLACE TABLE `federal-434709.sandbox.pay_details_v2`
+--CLUSTER BY actor_id, txn_date AS
 
 -- 1. pay data
 WITH pay_data AS (
@@ -29,7 +30,7 @@ WITH pay_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1
-            AND DATE_TRUNC(DATE(COALESCE(debited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(debited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'CREDIT'
             AND transaction_status = 'SUCCESS'
             AND account_from_type = 'SAVINGS'
@@ -59,7 +60,7 @@ WITH pay_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1 
-            AND DATE_TRUNC(DATE(COALESCE(credited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(credited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'DEBIT'
             AND transaction_status = 'SUCCESS'
             AND account_to_type = 'SAVINGS'
@@ -67,12 +68,15 @@ WITH pay_data AS (
     )
 ),
 
--- 2. min KYC
-min_kyc AS (
+-- 2. min KYC and account_operationally_closed (single scan of user_base_fact)
+excluded_users AS (
     SELECT DISTINCT actor_id
     FROM `common-tech-434709.datamart.user_base_fact`
-    WHERE DATE(onb_success_date) BETWEEN '2023-10-01' AND '2025-06-30'
-    AND current_kyc_level = 'Min KYC'
+    WHERE (
+        DATE(onb_success_date) BETWEEN '2023-10-01' AND '2025-06-30'
+        AND current_kyc_level = 'Min KYC'
+    )
+    OR account_closed_flag = 1
 ),
 
 -- 3. risk_blocked_actors
@@ -85,14 +89,7 @@ risk AS (
     AND DATE(latest_risk_blocked_date) <= DATE('2025-05-30')
 ),
 
--- 4. account_operationally_closed
-closed_accounts AS (
-    SELECT actor_id 
-    FROM `common-tech-434709.datamart.user_base_fact`
-    WHERE account_closed_flag = 1
-),
-
--- 5. actors account_created_date
+-- 4. actors account_created_date
 actor_base AS (
     SELECT onb.actor_id,
             onb.onb_date,
@@ -105,11 +102,9 @@ actor_base AS (
         WHERE DATE(Account_created_at_ist) BETWEEN '2023-10-01' AND '2025-06-30'
     ) onb 
     LEFT JOIN risk r ON onb.actor_id = r.actor_id
-    LEFT JOIN closed_accounts cld ON onb.actor_id = cld.actor_id
-    LEFT JOIN min_kyc mk ON onb.actor_id = mk.actor_id
+    LEFT JOIN excluded_users ex ON onb.actor_id = ex.actor_id
     WHERE r.actor_id IS NULL
-    AND cld.actor_id IS NULL
-    AND mk.actor_id IS NULL
+    AND ex.actor_id IS NULL
 )
 
 -- Final select
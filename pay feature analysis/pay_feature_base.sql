@@ -1,6 +1,7 @@
 -- BigQuery compatible version of pay_features_base_v2.sql
 -- Creates: federal-434709.dataview.pay_features_base_v5 with all 16 features
---CREATE OR REPLACE TABLE `federal-434709.dataview.pay_features_base_v5` AS
+--CREATE OR REPLACE TABLE `federal-434709.dataview.pay_features_base_v5`
+--CLUSTER BY actor_id, feature_name AS
 
 -- 1. pay_base
 WITH pay_data AS (
@@ -28,7 +29,7 @@ WITH pay_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1
-            AND DATE_TRUNC(DATE(COALESCE(debited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(debited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'CREDIT'
             AND transaction_status = 'SUCCESS'
             AND account_from_type = 'SAVINGS'
@@ -58,7 +59,7 @@ WITH pay_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1 
-            AND DATE_TRUNC(DATE(COALESCE(credited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(credited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'DEBIT'
             AND transaction_status = 'SUCCESS'
             AND account_to_type = 'SAVINGS'
@@ -92,7 +93,7 @@ tpap_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1
-            AND DATE_TRUNC(DATE(COALESCE(debited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(debited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'CREDIT'
             AND transaction_status = 'SUCCESS'
             AND account_from_type = 'TPAP ACCOUNT'
@@ -122,7 +123,7 @@ tpap_data AS (
             `federal-434709.datamart.pay_transactions` a
         WHERE
             1=1 
-            AND DATE_TRUNC(DATE(COALESCE(credited_at_ist, server_created_at_ist)), MONTH) BETWEEN '2023-10-01' AND '2025-06-30'
+            AND DATE(COALESCE(credited_at_ist, server_created_at_ist)) BETWEEN '2023-10-01' AND '2025-06-30'
             AND UPPER(credit_debit) != 'DEBIT'
             AND transaction_status = 'SUCCESS'
             AND account_to_type = 'TPAP ACCOUNT'
@@ -130,12 +131,15 @@ tpap_data AS (
     )
 ),
 
--- 3. min KYC
-min_kyc AS (
+-- 3. min KYC and account_operationally_closed (single scan of user_base_fact)
+excluded_users AS (
     SELECT DISTINCT actor_id
     FROM `common-tech-434709.datamart.user_base_fact`
-    WHERE DATE(onb_success_date) BETWEEN '2023-10-01' AND '2025-06-30'
-    AND current_kyc_level = 'Min KYC'
+    WHERE (
+        DATE(onb_success_date) BETWEEN '2023-10-01' AND '2025-06-30'
+        AND current_kyc_level = 'Min KYC'
+    )
+    OR account_closed_flag = 1
 ),
 
 -- 4. risk_blocked_actors
@@ -148,14 +152,7 @@ risk AS (
     AND DATE(latest_risk_blocked_date) <= DATE('2025-05-30')
 ),
 
--- 5. account_operationally_closed
-closed_accounts AS (
-    SELECT actor_id 
-    FROM `common-tech-434709.datamart.user_base_fact`
-    WHERE account_closed_flag = 1
-),
-
--- 6. actors account_created_date
+-- 5. actors account_created_date
 actor_base AS (
     SELECT onb.actor_id,
             onb.onb_date,
@@ -168,218 +165,91 @@ actor_base AS (
         WHERE DATE(Account_created_at_ist) BETWEEN '2023-10-01' AND '2025-06-30'
     ) onb 
     LEFT JOIN risk r ON onb.actor_id = r.actor_id
-    LEFT JOIN closed_accounts cld ON onb.actor_id = cld.actor_id
-    LEFT JOIN min_kyc mk ON onb.actor_id = mk.actor_id
+    LEFT JOIN excluded_users ex ON onb.actor_id = ex.actor_id
     WHERE r.actor_id IS NULL
-    AND cld.actor_id IS NULL
-    AND mk.actor_id IS NULL
+    AND ex.actor_id IS NULL
 ),
 
--- 7. features_base for pay
-features AS (
-    -- 1. Pay - Bank transfer (non UPI)
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - Bank transfer (non UPI)' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE payment_protocol IN ('IMPS', 'NEFT', 'RTGS')
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 2. Pay - FiFed - UPI - Phone Number
-    SELECT DISTINCT actor_id,
+-- 6. feature activity for pay (one row per actor, activity date and feature)
+-- Each source is scanned once; its rows fan out via UNNEST to every feature they qualify for
+feature_activity AS (
+    -- 1-4, 10, 11, 16. FiFed transactions: Pay - Bank transfer (non UPI), Pay - FiFed - UPI - Phone Number,
+    --      Pay - FiFed - UPI - QR Scan, Pay - Intent, Pay - Self transfer - Add Funds to Fi,
+    --      Pay - Standing Instructions, Pay - via timeline (FiFed and TPAP)
+    SELECT actor_id,
         txn_date AS feature_activity_date,
-        'Pay - FiFed - UPI - Phone Number' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE ui_entry_point = 'TIMELINE'
-    AND credit_debit != 'Credit'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 3. Pay - FiFed - UPI - QR Scan
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - FiFed - UPI - QR Scan' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE LOWER(ui_entry_point) LIKE '%qr%'
-    AND credit_debit != 'Credit'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 4. Pay - Intent
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - Intent' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE LOWER(ui_entry_point) LIKE '%intent%'
-    AND credit_debit != 'Credit'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 5. Pay - Any, Pay - Debit - P2M - COLLECT REQUEST, Pay - Debit - Off App - P2M - ENACH, Pay - Debit - UPI Autopay
-    SELECT DISTINCT actor_id,
-        feature_activity_date,
-        feature_name,
-        MIN(feature_activity_date) OVER (PARTITION BY actor_id, feature_name) AS feature_first_activity_date
-    FROM (
-        SELECT actor_id,
-            daily_date AS feature_activity_date,
-            feature AS feature_name
-        FROM `common-tech-434709.cross_db.fc_usage_base_static`
-        WHERE LOWER(product) = 'pay'
-        AND feature IN ('Pay - Any', 'Pay - Debit - P2M - COLLECT REQUEST', 'Pay - Debit - Off App - P2M - ENACH', 'Pay - Debit - UPI Autopay')
-        AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-    )
-
-    UNION ALL
-
-    -- 6. Pay - Off app
-    SELECT DISTINCT actor_id,
-        daily_date AS feature_activity_date,
-        'Pay - Off app' AS feature_name,
-        MIN(daily_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM `common-tech-434709.cross_db.fc_usage_base_static`
-    WHERE LOWER(product) = 'pay'
-    AND feature LIKE '%Off App%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 7. Pay - On app
-    SELECT DISTINCT actor_id,
-        daily_date AS feature_activity_date,
-        'Pay - On app' AS feature_name,
-        MIN(daily_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM `common-tech-434709.cross_db.fc_usage_base_static`
-    WHERE LOWER(product) = 'pay'
-    AND feature LIKE '%On App%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
+        feature_name
+    FROM pay_data,
+    UNNEST([
+        IF(payment_protocol IN ('IMPS', 'NEFT', 'RTGS'), 'Pay - Bank transfer (non UPI)', NULL),
+        IF(ui_entry_point = 'TIMELINE' AND credit_debit != 'Credit', 'Pay - FiFed - UPI - Phone Number', NULL),
+        IF(LOWER(ui_entry_point) LIKE '%qr%' AND credit_debit != 'Credit', 'Pay - FiFed - UPI - QR Scan', NULL),
+        IF(LOWER(ui_entry_point) LIKE '%intent%' AND credit_debit != 'Credit', 'Pay - Intent', NULL),
+        IF(add_funds_method = 'TPAP Add Funds', 'Pay - Self transfer - Add Funds to Fi', NULL),
+        IF(tags IS NOT NULL AND LOWER(TO_JSON_STRING(tags)) LIKE '%standing%', 'Pay - Standing Instructions', NULL),
+        'Pay - via timeline (FiFed and TPAP)'
+    ]) AS feature_name
+    WHERE feature_name IS NOT NULL
 
     UNION ALL
 
-    -- 8. Pay - P2P
-    SELECT DISTINCT actor_id,
+    -- 5-9. Feature usage: Pay - Any, Pay - Debit - P2M - COLLECT REQUEST, Pay - Debit - Off App - P2M - ENACH,
+    --      Pay - Debit - UPI Autopay, Pay - Off app, Pay - On app, Pay - P2P, Pay - P2M
+    SELECT actor_id,
         daily_date AS feature_activity_date,
-        'Pay - P2P' AS feature_name,
-        MIN(daily_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM `common-tech-434709.cross_db.fc_usage_base_static`
+        feature_name
+    FROM `common-tech-434709.cross_db.fc_usage_base_static`,
+    UNNEST([
+        IF(feature IN ('Pay - Any', 'Pay - Debit - P2M - COLLECT REQUEST', 'Pay - Debit - Off App - P2M - ENACH', 'Pay - Debit - UPI Autopay'), feature, NULL),
+        IF(feature LIKE '%Off App%', 'Pay - Off app', NULL),
+        IF(feature LIKE '%On App%', 'Pay - On app', NULL),
+        IF(feature LIKE '%P2P%', 'Pay - P2P', NULL),
+        IF(feature LIKE '%P2M%', 'Pay - P2M', NULL)
+    ]) AS feature_name
     WHERE LOWER(product) = 'pay'
-    AND feature LIKE '%P2P%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
+    AND feature_name IS NOT NULL
 
     UNION ALL
 
-    -- 9. Pay - P2M
-    SELECT DISTINCT actor_id,
-        daily_date AS feature_activity_date,
-        'Pay - P2M' AS feature_name,
-        MIN(daily_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM `common-tech-434709.cross_db.fc_usage_base_static`
-    WHERE LOWER(product) = 'pay'
-    AND feature LIKE '%P2M%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 10. Pay - Self transfer - Add Funds to Fi
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - Self transfer - Add Funds to Fi' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE add_funds_method = 'TPAP Add Funds'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 11. Pay - Standing Instructions
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - Standing Instructions' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM pay_data
-    WHERE tags IS NOT NULL 
-    AND LOWER(TO_JSON_STRING(tags)) LIKE '%standing%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 12. Pay - TPAP - Rupay CC
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - TPAP - Rupay CC' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM tpap_data
-    WHERE LOWER(account_from_type) LIKE '%credit%'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 13. Pay - TPAP - UPI - Phone Number
-    SELECT DISTINCT actor_id,
+    -- 12-14, 16. TPAP transactions: Pay - TPAP - Rupay CC, Pay - TPAP - UPI - Phone Number,
+    --      Pay - TPAP - UPI - QR Scan, Pay - via timeline (FiFed and TPAP)
+    SELECT actor_id,
         txn_date AS feature_activity_date,
-        'Pay - TPAP - UPI - Phone Number' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM tpap_data
-    WHERE ui_entry_point = 'TIMELINE'
-    AND credit_debit != 'Credit'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
-
-    UNION ALL
-
-    -- 14. Pay - TPAP - UPI - QR Scan
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - TPAP - UPI - QR Scan' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM tpap_data
-    WHERE LOWER(ui_entry_point) LIKE '%qr%'
-    AND credit_debit != 'Credit'
-    AND actor_id IN (SELECT DISTINCT actor_id FROM actor_base)
+        feature_name
+    FROM tpap_data,
+    UNNEST([
+        IF(LOWER(account_from_type) LIKE '%credit%', 'Pay - TPAP - Rupay CC', NULL),
+        IF(ui_entry_point = 'TIMELINE' AND credit_debit != 'Credit', 'Pay - TPAP - UPI - Phone Number', NULL),
+        IF(LOWER(ui_entry_point) LIKE '%qr%' AND credit_debit != 'Credit', 'Pay - TPAP - UPI - QR Scan', NULL),
+        'Pay - via timeline (FiFed and TPAP)'
+    ]) AS feature_name
+    WHERE feature_name IS NOT NULL
 
     UNION ALL
 
     -- 15. Pay - UPI Mapper
-    SELECT DISTINCT actor_id,
-        event_date AS feature_activity_date,
-        'Pay - UPI Mapper' AS feature_name,
-        MIN(event_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
-    FROM (
-        SELECT 
-            user_id AS actor_id,
-            event,
-            properties,
-            timestamp,
-            DATE(timestamp) AS event_date
-        FROM `common-tech-434709.events.events`
-        WHERE flow_name = 'pay'
-        AND event IN ('UpiNumberLinked', 'UpiNumberUnlinked', 'UpiNumberInitiateLink')
-        AND DATE(timestamp) >= '2025-01-30'
-        AND date >= '2025-01-30'
-        AND user_id IN (SELECT DISTINCT actor_id FROM actor_base)
-    )
-
-    UNION ALL
+    SELECT user_id AS actor_id,
+        DATE(timestamp) AS feature_activity_date,
+        'Pay - UPI Mapper' AS feature_name
+    FROM `common-tech-434709.events.events`
+    WHERE flow_name = 'pay'
+    AND event IN ('UpiNumberLinked', 'UpiNumberUnlinked', 'UpiNumberInitiateLink')
+    AND date >= '2025-01-30'
+    AND timestamp >= TIMESTAMP('2025-01-30')
+),
 
-    -- 16. Pay - via timeline (FiFed and TPAP)
-    SELECT DISTINCT actor_id,
-        txn_date AS feature_activity_date,
-        'Pay - via timeline (FiFed and TPAP)' AS feature_name,
-        MIN(txn_date) OVER (PARTITION BY actor_id) AS feature_first_activity_date
+-- 7. features_base for pay: restrict to base actors and dedup once, then take first activity per feature
+features AS (
+    SELECT actor_id,
+        feature_activity_date,
+        feature_name,
+        MIN(feature_activity_date) OVER (PARTITION BY actor_id, feature_name) AS feature_first_activity_date
     FROM (
-        SELECT DISTINCT actor_id, txn_date
-        FROM pay_data
-        UNION ALL
-        SELECT DISTINCT actor_id, txn_date
-        FROM tpap_data
+        SELECT DISTINCT actor_id,
+            feature_activity_date,
+            feature_name
+        FROM feature_activity
+        WHERE actor_id IN (SELECT actor_id FROM actor_base)
     )
 )
 
@@ -392,5 +262,4 @@ SELECT
     b.feature_name,
     b.feature_first_activity_date
 FROM actor_base a
-LEFT JOIN features b ON a.actor_id = b.actor_id
-ORDER BY actor_id, feature_activity_date; 
\ No newline at end of file
+LEFT JOIN features b ON a.actor_id = b.actor_id; 
\ No newline at end of file